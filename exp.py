@@ -1,8 +1,19 @@
 import streamlit as st
-import requests
-from json import loads
-from PIL import Image
+import httpx
+import asyncio
+import importlib.util
+import threading
+import time
+import re
+from collections import namedtuple
 from io import BytesIO
+from math import ceil
+
+# orjson parses the large PubChem JSON records much faster; fall back to the stdlib parser
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads
 
 # Streamlit title
 st.title("PubChem Search Interface")
@@ -12,55 +23,408 @@ st.sidebar.title("Search Methods")
 # Define the Base URL for the PubChem PUG REST API
 BASE_URL = "https://pubchem.ncbi.nlm.nih.gov/rest/pug"
 
+# Endpoint URL templates, filled in with str.format at call time
+PROPERTIES = "MolecularFormula,MolecularWeight,SMILES"
+PNG_TMPL = BASE_URL + "/compound/cid/{cid}/record/PNG"
+PROPERTY_TMPL = BASE_URL + "/compound/cid/{cid}/property/" + PROPERTIES + "/JSON"
+PROPERTY_BATCH_URL = BASE_URL + "/compound/cid/property/" + PROPERTIES + "/JSON"
+RECORD_JSON_TMPL = BASE_URL + "/compound/cid/{cid}/JSON"
+SDF_TMPL = BASE_URL + "/compound/cid/{cid}/SDF"
+NAME_CIDS_TMPL = BASE_URL + "/compound/name/{name}/cids/TXT"
+SMILES_CIDS_TMPL = BASE_URL + "/compound/smiles/{smiles}/cids/TXT"
+FORMULA_CIDS_TMPL = BASE_URL + "/compound/fastformula/{formula}/cids/TXT"
+MASS_EQUALS_TMPL = BASE_URL + "/compound/{mass_type}/equals/{value}/cids/TXT"
+MASS_RANGE_TMPL = BASE_URL + "/compound/{mass_type}/range/{min}/{max}/cids/TXT"
+# Asynchronous search endpoints answer with a ListKey that is polled for the CIDs
+SIMILARITY_URL = BASE_URL + "/compound/similarity/smiles/JSON"
+STRUCTURE_TMPL = BASE_URL + "/compound/{search_type}/smiles/JSON"
+LISTKEY_TMPL = BASE_URL + "/compound/listkey/{list_key}/cids/JSON"
+XREF_TMPL = BASE_URL + "/substance/xref/{xref_type}/{xref_value}/sids/JSON"
+
+# Structure image sizes: full resolution for single-compound views, thumbnails for result grids
+DETAIL_IMAGE_SIZE = "600x600"
+THUMBNAIL_IMAGE_SIZE = "200x200"
+
+# Cheap client-side checks that reject malformed input before a PubChem round-trip
+SMILES_RE = re.compile(r"^[A-Za-z0-9@+\-\[\]\(\)=#$/\\%.:*]+$")
+FORMULA_RE = re.compile(r"^([A-Z][a-z]?\d*)+$")
+
+# Minimum spacing between concurrent request starts, matching PubChem's 5 requests/second limit
+REQUEST_INTERVAL = 0.2
+
+# Cap on the number of CIDs returned by structure and similarity searches
+DEFAULT_MAX_RECORDS = 50
+
+# Result grid layout
+PAGE_SIZE = 12
+GRID_COLUMNS = 3
+
+
+# Initialize session state for storing the last (smiles, threshold, max_records) Similarity Search
+if "similarity_query" not in st.session_state:
+    st.session_state["similarity_query"] = None
+
+# Initialize session state for storing result CIDs per search method, so paging survives reruns
+if "results" not in st.session_state:
+    st.session_state["results"] = {}
+
+# HTTP/2 needs the optional h2 package; fall back to HTTP/1.1 keep-alive without it
+HTTP2 = importlib.util.find_spec("h2") is not None
+
+# PubChem answers 503 "server busy" and 429 when throttled, so those are retried with backoff
+RETRY_TOTAL = 3
+RETRY_BACKOFF_FACTOR = 0.3
+RETRY_STATUS_FORCELIST = (429, 500, 502, 503, 504)
+
+class RetryTransport(httpx.BaseTransport):
+    """Transport that retries responses with a retryable status, with exponential backoff."""
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    def handle_request(self, request):
+        for attempt in range(RETRY_TOTAL + 1):
+            response = self.transport.handle_request(request)
+            if response.status_code not in RETRY_STATUS_FORCELIST or attempt == RETRY_TOTAL:
+                return response
+            response.close()
+            time.sleep(RETRY_BACKOFF_FACTOR * 2 ** attempt)
+
+    def close(self):
+        self.transport.close()
+
+class AsyncRetryTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of RetryTransport."""
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    async def handle_async_request(self, request):
+        for attempt in range(RETRY_TOTAL + 1):
+            response = await self.transport.handle_async_request(request)
+            if response.status_code not in RETRY_STATUS_FORCELIST or attempt == RETRY_TOTAL:
+                return response
+            await response.aclose()
+            await asyncio.sleep(RETRY_BACKOFF_FACTOR * 2 ** attempt)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+# Shared HTTP/2 client so requests to PubChem are multiplexed over one reused connection
+@st.cache_resource
+def get_client():
+    """Create a pooled HTTP/2 client for the PubChem API."""
+    transport = httpx.HTTPTransport(
+        http2=HTTP2,
+        retries=RETRY_TOTAL,
+        limits=httpx.Limits(max_connections=16, max_keepalive_connections=8),
+    )
+    return httpx.Client(transport=RetryTransport(transport), timeout=10.0)
+
+def async_client():
+    """Create an HTTP/2 client for concurrent requests inside an event loop."""
+    transport = httpx.AsyncHTTPTransport(
+        http2=HTTP2,
+        retries=RETRY_TOTAL,
+        limits=httpx.Limits(max_connections=8),
+    )
+    return httpx.AsyncClient(transport=AsyncRetryTransport(transport), timeout=30.0)
+
+# Lightweight copy of a response, so the connection goes back to the pool straight away
+Result = namedtuple("Result", "status body ctype")
+
+# Bodies are read in fixed-size chunks instead of letting httpx buffer the whole response.
+# The finished body is still kept by st.cache_data and, for PNG/SDF, by the validator cache.
+STREAM_CHUNK_SIZE = 65536
+
+def to_result(response, streamed=False):
+    """Copy status, body and content type out of a response and release it."""
+    if streamed:
+        buffer = BytesIO()
+        for chunk in response.iter_bytes(STREAM_CHUNK_SIZE):
+            buffer.write(chunk)
+        body = buffer.getvalue()
+    else:
+        # Non-streamed responses are already fully read
+        body = response.content
+    result = Result(response.status_code, body, response.headers.get("content-type", ""))
+    response.close()
+    return result
+
+# ETag/Last-Modified validators of earlier PNG and SDF responses, so an expired cache entry
+# is revalidated with a tiny 304 instead of downloading the whole body again
+VALIDATOR_CACHE_SIZE = 512
+VALIDATOR_CACHE_BYTES = 64 * 1024 * 1024
+
+@st.cache_resource
+def get_validator_cache():
+    """Create the URL-keyed store of validators and bodies, with the lock guarding it."""
+    return threading.Lock(), {}
+
+# Hot GET endpoints are requested with the same URL/params/headers over and over,
+# so build each httpx.Request once and only send it on later calls and reruns
+@st.cache_resource(max_entries=256, show_spinner=False)
+def prepare_get(endpoint, params_tuple=(), headers_tuple=(), timeout=10):
+    """Build the GET request for an endpoint, parameters and headers."""
+    return get_client().build_request(
+        "GET", endpoint, params=dict(params_tuple), headers=dict(headers_tuple), timeout=timeout
+    )
+
+def conditional_get(endpoint, params=None, timeout=10, revalidate=False):
+    """GET a URL, sending If-None-Match/If-Modified-Since when a body is already known.
+
+    Only responses fetched with revalidate=True are remembered for later revalidation.
+    """
+    lock, cache = get_validator_cache()
+    params_tuple = tuple(sorted((params or {}).items()))
+    key = str(httpx.URL(endpoint, params=params_tuple))
+    with lock:
+        cached = cache.get(key)
+    headers = {}
+    if cached:
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+    request = prepare_get(endpoint, params_tuple, tuple(sorted(headers.items())), timeout)
+    response = get_client().send(request, stream=True)
+    try:
+        if response.status_code == 304 and cached:
+            # Stored as a plain tuple: Result is redefined on every script rerun
+            return Result(*cached["result"])
+        response.raise_for_status()
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+        result = to_result(response, streamed=True)
+    finally:
+        response.close()
+    if revalidate and (etag or last_modified):
+        with lock:
+            cache.pop(key, None)
+            cache[key] = {"etag": etag, "last_modified": last_modified, "result": tuple(result)}
+            # Drop the oldest entries once the store grows past its entry or byte budget
+            while len(cache) > VALIDATOR_CACHE_SIZE or (
+                len(cache) > 1 and sum(len(entry["result"][1]) for entry in cache.values()) > VALIDATOR_CACHE_BYTES
+            ):
+                cache.pop(next(iter(cache)))
+    return result
+
+# Cached GET requests, keyed by endpoint and a hashable tuple of parameters
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
+def _fetch_get(endpoint, params_tuple=(), timeout=10, revalidate=False):
+    """Fetch data from PubChem API with a GET request, caching successful responses."""
+    return conditional_get(endpoint, dict(params_tuple), timeout, revalidate)
 
-# Initialize session state for storing CIDs list for Similarity Search
-if "similarity_cids" not in st.session_state:
-    st.session_state["similarity_cids"] = []
+# POST requests are user-driven searches and are not cached
+def _fetch_post(endpoint, params=None, timeout=10):
+    """Fetch data from PubChem API with a POST request."""
+    response = get_client().post(endpoint, data=params, timeout=timeout)
+    response.raise_for_status()
+    return to_result(response)
 
 # Helper function to fetch data
-def fetch_data(endpoint, params=None, method="GET"):
+def fetch_data(endpoint, params=None, method="GET", timeout=10, revalidate=False):
     """Helper function to fetch data from PubChem API."""
     try:
         if method == "GET":
-            response = requests.get(endpoint, params=params)
+            return _fetch_get(endpoint, tuple(sorted((params or {}).items())), timeout, revalidate)
         elif method == "POST":
-            response = requests.post(endpoint, data=params)
-
-        # Check for a successful request
-        if response.status_code == 200:
-            return response
-        else:
-            st.error(f"Error {response.status_code}: {response.reason}")
+            return _fetch_post(endpoint, params, timeout)
+    except httpx.HTTPStatusError as e:
+        st.error(f"Error {e.response.status_code}: {e.response.reason_phrase}")
     except Exception as e:
         st.error(f"Failed to fetch data: {e}")
     return None
 
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
+def fetch_png_bytes(cid, size=DETAIL_IMAGE_SIZE):
+    """Fetch the PNG image of a compound given its CID."""
+    return conditional_get(PNG_TMPL.format(cid=cid), {"image_size": size}, revalidate=True).body
+
+# Properties for a whole list of CIDs in one round-trip
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
+def fetch_properties_batch(cids):
+    """Fetch formula, weight and SMILES for a tuple of CIDs with a single POST."""
+    response = get_client().post(
+        PROPERTY_BATCH_URL,
+        data={"cid": ",".join(cids)},
+        timeout=15,
+    )
+    response.raise_for_status()
+    return loads(response.content)["PropertyTable"]["Properties"]
+
+def display_properties(cids):
+    """Display a table of properties for several compounds given their CIDs."""
+    try:
+        properties = fetch_properties_batch(tuple(sorted(cids, key=int)))
+    except Exception as e:
+        st.error(f"Failed to fetch properties: {e}")
+        return
+    # The cache key is sorted; show the rows in the same order as the structure grid
+    by_cid = {str(row["CID"]): row for row in properties}
+    st.dataframe([by_cid[cid] for cid in cids if cid in by_cid])
+
+# Heavy structure searches are answered with a ListKey that has to be polled
+async def poll_listkey(list_key, progress, max_wait=120):
+    """Poll PubChem until the search behind a ListKey finishes and return its CIDs."""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    async with async_client() as client:
+        while True:
+            await asyncio.sleep(1.0)
+            elapsed = loop.time() - start
+            progress.progress(min(elapsed / max_wait, 1.0), text=f"Waiting for PubChem ({elapsed:.0f}s)...")
+            response = await client.get(LISTKEY_TMPL.format(list_key=list_key))
+            response.raise_for_status()
+            data = loads(response.content)
+            if "Waiting" not in data:
+                return data["IdentifierList"]["CID"]
+            if elapsed > max_wait:
+                raise TimeoutError(f"PubChem search did not finish within {max_wait} seconds")
+
+def search_cids(endpoint, smiles, params=None):
+    """Run a SMILES structure search, polling the ListKey if PubChem answers asynchronously."""
+    response = get_client().post(endpoint, data={"smiles": smiles}, params=params, timeout=30)
+    response.raise_for_status()
+    data = loads(response.content)
+    if "Waiting" in data:
+        progress = st.progress(0.0, text="Waiting for PubChem...")
+        try:
+            cids = asyncio.run(poll_listkey(data["Waiting"]["ListKey"], progress))
+        finally:
+            progress.empty()
+    else:
+        cids = data["IdentifierList"]["CID"]
+    return [str(cid) for cid in cids]
+
+# Similarity results are a pure function of (smiles, threshold, max_records). They are kept in
+# a store held by st.cache_resource instead of st.cache_data, so the progress bar shown while
+# polling is created in the script and never replayed from the cache.
+@st.cache_resource(ttl=1800, show_spinner=False)
+def get_similarity_store():
+    """Create the store of similarity search results, cleared every 30 minutes."""
+    return {}
+
+def similarity_cids(smiles, threshold, max_records=DEFAULT_MAX_RECORDS):
+    """Fetch the CIDs of compounds similar to a SMILES string."""
+    store = get_similarity_store()
+    key = (smiles, threshold, max_records)
+    if key not in store:
+        store[key] = search_cids(SIMILARITY_URL, smiles, {"Threshold": threshold, "MaxRecords": max_records})
+    return list(store[key])
+
+# Input validation helpers
+def is_valid_smiles(smiles):
+    """Check that a SMILES string uses allowed characters and balanced parentheses/brackets."""
+    if not SMILES_RE.match(smiles):
+        return False
+    depth = {"(": 0, "[": 0}
+    for char in smiles:
+        if char in "([":
+            depth[char] += 1
+        elif char in ")]":
+            opening = "(" if char == ")" else "["
+            depth[opening] -= 1
+            if depth[opening] < 0:
+                return False
+    return depth["("] == 0 and depth["["] == 0
+
+def validate_smiles(smiles):
+    """Stop the script with an error if the SMILES string is malformed."""
+    if not is_valid_smiles(smiles):
+        st.error("Invalid SMILES string. Please check the characters and parentheses/brackets.")
+        st.stop()
+
 # Function to display the structure of a compound by CID
-def display_structure(cid):
+def display_structure(cid, size=DETAIL_IMAGE_SIZE):
     """Display the image of a compound given its CID."""
-    image_url = f"{BASE_URL}/compound/cid/{cid}/record/PNG?image_size=600x600"
-    response = requests.get(image_url)
-    if response.status_code == 200:
-        # Load the image via Pillow
-        img = Image.open(BytesIO(response.content))
-        # Resize the image to desired dimensions (e.g., 300x300)
-        img = img.resize((600, 600))  # Adjust as needed
-        # Display the resized image
-        st.image(
-            img,
-            caption=f"CID {cid}",
-        )
-    else:
+    try:
+        content = fetch_png_bytes(cid, size)
+    except Exception:
         st.error(f"Could not retrieve image for CID {cid}")
+        return
+    # PubChem already renders the requested size, so pass the PNG bytes through as-is
+    st.image(
+        content,
+        caption=f"CID {cid}",
+    )
+
+# Concurrent image downloads for lists of CIDs
+async def fetch_png(client, semaphore, cid, size, delay=0.0):
+    """Download the PNG image of a single compound after waiting for its start slot."""
+    await asyncio.sleep(delay)
+    async with semaphore:
+        try:
+            response = await client.get(PNG_TMPL.format(cid=cid), params={"image_size": size})
+            if response.status_code == 200:
+                return cid, response.content
+        except httpx.HTTPError:
+            pass
+    return cid, None
+
+async def fetch_all(cids, size):
+    """Download the PNG images of all given CIDs concurrently."""
+    # PubChem allows at most 5 requests per second: start requests 0.2 s apart
+    # and also bound how many are in flight at once
+    semaphore = asyncio.Semaphore(5)
+    async with async_client() as client:
+        return await asyncio.gather(
+            *[fetch_png(client, semaphore, cid, size, i * REQUEST_INTERVAL) for i, cid in enumerate(cids)]
+        )
+
+class IncompleteImageBatch(Exception):
+    """Raised when some images of a batch failed, carrying the partial (cid, content) pairs."""
+
+    def __init__(self, results):
+        super().__init__("Could not retrieve every image in the batch")
+        self.results = results
+
+@st.cache_data(ttl=3600, max_entries=512, show_spinner=False)
+def fetch_png_bytes_batch(cids, size=THUMBNAIL_IMAGE_SIZE):
+    """Fetch the PNG images of a tuple of CIDs, returning (cid, content) pairs."""
+    results = asyncio.run(fetch_all(cids, size))
+    # Raising keeps a batch with transient failures out of the cache
+    if any(content is None for _, content in results):
+        raise IncompleteImageBatch(results)
+    return results
+
+def display_structures(cids, size=THUMBNAIL_IMAGE_SIZE):
+    """Display the images of several compounds given their CIDs in a grid."""
+    try:
+        results = fetch_png_bytes_batch(tuple(cids), size)
+    except IncompleteImageBatch as e:
+        results = e.results
+    cols = st.columns(GRID_COLUMNS)
+    for i, (cid, content) in enumerate(results):
+        col = cols[i % GRID_COLUMNS]
+        if content:
+            col.image(content, caption=f"CID {cid}")
+        else:
+            col.error(f"Could not retrieve image for CID {cid}")
+
+def display_compounds(method, cids):
+    """Display one page of properties and structures for the compounds found by a search method."""
+    n_pages = max(1, ceil(len(cids) / PAGE_SIZE))
+    page = st.number_input("Page", min_value=1, max_value=n_pages, step=1, key=f"page_{method}")
+    page = min(page, n_pages)
+    st.caption(f"Page {page} of {n_pages}")
+    # Only the visible page is fetched
+    page_cids = cids[(page - 1) * PAGE_SIZE : page * PAGE_SIZE]
+    display_properties(page_cids)
+    display_structures(page_cids)
+
+def store_results(method, cids):
+    """Remember the CIDs found by a search method and reset the grid to its first page."""
+    st.session_state["results"][method] = cids
+    st.session_state[f"page_{method}"] = 1
 
 # ---- Helper for "View All Compounds" Logic ----
 def handle_view_all():
-    """Display all compounds for the stored CIDs in session state."""
-    if not st.session_state["similarity_cids"]:
+    """Show all compounds for the last similarity search stored in session state."""
+    if not st.session_state["similarity_query"]:
         st.warning("No compounds to display. Perform a search first.")
     else:
-        for cid in st.session_state["similarity_cids"]:
-            display_structure(cid)
+        store_results("By Similarity Search", similarity_cids(*st.session_state["similarity_query"]))
 
 
 # Sidebar options for search methods
@@ -90,25 +454,32 @@ if search_method == "By CID":
     cid = st.text_input("Enter PubChem CID:", "2244")
     if st.button("Search"):
         # Fetch compound data and structure
-        data = fetch_data(f"{BASE_URL}/compound/cid/{cid}/property/MolecularFormula,MolecularWeight,SMILES/JSON")
+        data = fetch_data(PROPERTY_TMPL.format(cid=cid))
         if data:
-            st.json(loads(data.text))
-            display_structure(cid)
+            st.json(loads(data.body))
+            display_structure(cid, DETAIL_IMAGE_SIZE)
 
 # ---- Similarity Search ----
 elif search_method == "By Similarity Search":
     st.subheader("Search by Similarity")
     smiles = st.text_input("Enter SMILES string for similarity search:", "CC(=O)OC1=CC=CC=C1C(=O)O")
     threshold = st.slider("Similarity Threshold (1-100):", min_value=1, max_value=100, value=90)
+    max_records = st.number_input("Max results:", min_value=10, max_value=500, value=DEFAULT_MAX_RECORDS)
 
     if st.button("Search"):
+        smiles = smiles.strip()
+        validate_smiles(smiles)
         # Fetch similar compounds
-        endpoint = f"{BASE_URL}/compound/fastsimilarity_2d/smiles/cids/TXT?Threshold={threshold}"
-        response = fetch_data(endpoint, {"smiles": smiles}, method="POST")
-        if response and response.text.strip():
-            st.session_state["similarity_cids"] = response.text.strip().split()  # Store CIDs in session state
-            st.write(f"Found {len(st.session_state['similarity_cids'])} similar compounds.")
-            st.write(f"CIDs: {st.session_state['similarity_cids']}")
+        st.session_state["results"].pop(search_method, None)
+        try:
+            cids_list = similarity_cids(smiles, threshold, max_records)
+        except Exception as e:
+            st.error(f"Failed to fetch data: {e}")
+            cids_list = []
+        if cids_list:
+            st.session_state["similarity_query"] = (smiles, threshold, max_records)  # Store the query in session state
+            st.write(f"Found {len(cids_list)} similar compounds.")
+            st.write(f"CIDs: {cids_list}")
         else:
             st.error("No similar compounds found.")
 
@@ -123,25 +494,25 @@ elif search_method == "View Full Records":
     
     # JSON View Block
     if st.button("View as JSON"):
-        json_url = f"{BASE_URL}/compound/cid/{cid}/JSON"  # URL to fetch JSON response
+        json_url = RECORD_JSON_TMPL.format(cid=cid)  # URL to fetch JSON response
         response = fetch_data(json_url)
         if response:
             st.success(f"Successfully retrieved the JSON response for CID {cid}.")
             st.write("### JSON Response:")
-            st.json(response.json())  # Display JSON data
+            st.json(loads(response.body))  # Display JSON data
         else:
             st.error("Failed to retrieve the JSON response. Please ensure the CID is correct.")
 
     # SDF Download Block
     if st.button("Download SDF"):
-        sdf_url = f"{BASE_URL}/compound/cid/{cid}/SDF"  # URL to fetch SDF file
-        response = fetch_data(sdf_url)
+        sdf_url = SDF_TMPL.format(cid=cid)  # URL to fetch SDF file
+        response = fetch_data(sdf_url, timeout=30, revalidate=True)  # SDF files can be several MB
         if response:
             st.success(f"Successfully retrieved the SDF file for CID {cid}.")
             # Create a download button for the SDF file
             st.download_button(
                 label="Download SDF File",
-                data=response.content,  # File content
+                data=response.body,  # File content
                 file_name=f"CID_{cid}.sdf",  # Suggested filename
                 mime="chemical/x-mdl-sdfile"  # MIME type for SDF files
             )
@@ -155,14 +526,12 @@ elif search_method == "By Name":
     name = st.text_input("Enter chemical name (e.g., glucose):", "glucose")
     if st.button("Search"):
         # Fetch CIDs by name
-        cids = fetch_data(f"{BASE_URL}/compound/name/{name}/cids/TXT")
-        if cids and cids.text.strip():
-            cids_list = cids.text.strip().split()
+        cids = fetch_data(NAME_CIDS_TMPL.format(name=name))
+        if cids and cids.body.strip():
+            cids_list = cids.body.decode().split()
             st.write(f"Found CIDs: {cids_list}")
             # Display properties and structures for each CID
-            for cid in cids_list:
-                st.write(f"**CID {cid}**:")
-                display_structure(cid)
+            store_results(search_method, cids_list)
             
             
 # ---- By SMILES Search ----
@@ -170,26 +539,30 @@ elif search_method == "By SMILES":
     st.subheader("Search by SMILES")
     smiles = st.text_input("Enter SMILES string:", "CC(=O)OC1=CC=CC=C1C(=O)O")
     if st.button("Search"):
+        smiles = smiles.strip()
+        validate_smiles(smiles)
         # Fetch CID by SMILES
-        cids = fetch_data(f"{BASE_URL}/compound/smiles/{smiles}/cids/TXT")
+        cids = fetch_data(SMILES_CIDS_TMPL.format(smiles=smiles))
         if cids:
-            cids_list = cids.text.strip().split()
+            cids_list = cids.body.decode().split()
             st.write(f"Found CIDs: {cids_list}")
-            for cid in cids_list:
-                display_structure(cid)
+            store_results(search_method, cids_list)
 
 # ---- By Molecular Formula Search ----
 elif search_method == "By Molecular Formula":
     st.subheader("Search by Molecular Formula")
     formula = st.text_input("Enter molecular formula (e.g., H2O):", "C6H12O6")
     if st.button("Search"):
+        formula = formula.strip()
+        if not FORMULA_RE.match(formula):
+            st.error("Invalid molecular formula. Use element symbols followed by counts, e.g. C6H12O6.")
+            st.stop()
         # Fetch CIDs by molecular formula
-        cids = fetch_data(f"{BASE_URL}/compound/fastformula/{formula}/cids/TXT")
+        cids = fetch_data(FORMULA_CIDS_TMPL.format(formula=formula))
         if cids:
-            cids_list = cids.text.strip().split()
+            cids_list = cids.body.decode().split()
             st.write(f"Found CIDs: {cids_list}")
-            for cid in cids_list:
-                display_structure(cid)
+            store_results(search_method, cids_list)
 
 # ---- By Mass Search ----
 elif search_method == "By Mass":
@@ -199,40 +572,43 @@ elif search_method == "By Mass":
     if mass_input_type == "Equals a Value":
         mass_value = st.number_input(f"Enter {mass_type}:", step=0.001, value=400.0)
         if st.button("Search Mass"):
-            endpoint = f"{BASE_URL}/compound/{mass_type}/equals/{mass_value}/cids/TXT"
+            endpoint = MASS_EQUALS_TMPL.format(mass_type=mass_type, value=mass_value)
             cids = fetch_data(endpoint)
             if cids:
-                cids_list = cids.text.strip().split()
+                cids_list = cids.body.decode().split()
                 st.write(f"Found CIDs: {cids_list}")
-                for cid in cids_list:
-                    display_structure(cid)
+                store_results(search_method, cids_list)
     elif mass_input_type == "Within Range":
         mass_min = st.number_input(f"Enter Minimum {mass_type}:", step=0.001, value=400.0)
         mass_max = st.number_input(f"Enter Maximum {mass_type}:", step=0.001, value=400.05)
         if st.button("Search Mass"):
-            endpoint = f"{BASE_URL}/compound/{mass_type}/range/{mass_min}/{mass_max}/cids/TXT"
+            endpoint = MASS_RANGE_TMPL.format(mass_type=mass_type, min=mass_min, max=mass_max)
             cids = fetch_data(endpoint)
             if cids:
-                cids_list = cids.text.strip().split()
+                cids_list = cids.body.decode().split()
                 st.write(f"Found CIDs: {cids_list}")
-                for cid in cids_list:
-                    display_structure(cid)
+                store_results(search_method, cids_list)
 
 # ---- By Structure Search (Substructure/Superstructure) ----
 elif search_method == "By Structure Search (Substructure/Superstructure)":
     st.subheader("Search by Structure")
     smiles = st.text_input("Enter substructure or superstructure SMILES string:", "C1CCCCC1")
     search_type = st.selectbox("Search Type:", ["substructure", "superstructure"])  # Select between substructure/superstructure
+    max_records = st.number_input("Max results:", min_value=10, max_value=500, value=DEFAULT_MAX_RECORDS)
 
     if st.button("Search"):
+        smiles = smiles.strip()
+        validate_smiles(smiles)
         # Use the correct search type based on the user's input
-        endpoint = f"{BASE_URL}/compound/fast{search_type}/smiles/cids/TXT"
-        cids = fetch_data(endpoint, {"smiles": smiles}, method="POST")
-        if cids:
-            cids_list = cids.text.strip().split()
+        endpoint = STRUCTURE_TMPL.format(search_type=search_type)
+        try:
+            cids_list = search_cids(endpoint, smiles, {"MaxRecords": max_records})
+        except Exception as e:
+            st.error(f"Failed to fetch data: {e}")
+            cids_list = []
+        if cids_list:
             st.write(f"Found CIDs: {cids_list}")
-            for cid in cids_list:
-                display_structure(cid)
+            store_results(search_method, cids_list)
 
 # ---- By Cross Reference ----
 elif search_method == "By Cross Reference":
@@ -240,7 +616,11 @@ elif search_method == "By Cross Reference":
     xref_type = st.text_input("Enter cross-reference type (e.g., PatentID):", "PatentID")
     xref_value = st.text_input("Enter cross-reference value:", "US20050159403A1")
     if st.button("Search"):
-        endpoint = f"{BASE_URL}/substance/xref/{xref_type}/{xref_value}/sids/JSON"
+        endpoint = XREF_TMPL.format(xref_type=xref_type, xref_value=xref_value)
         sids = fetch_data(endpoint)
         if sids:
-            st.json(loads(sids))
+            st.json(loads(sids.body))
+
+# ---- Paginated result grid for the current search method ----
+if st.session_state["results"].get(search_method):
+    display_compounds(search_method, st.session_state["results"][search_method])